@@ -1,10 +1,15 @@
 import sys
 from threading import Timer
 
-from binaryninja import Architecture
+from binaryninja import Architecture, PluginCommand
 
 from .patches import patch_debugger
-from .synacor import Synacor, SynacorCallingConvention, SynacorView
+from .synacor import (
+    Synacor, SynacorCallingConvention, SynacorSnapshotView, SynacorView
+)
+from .synacor.discovery import discover_via_emulation
+from .synacor.profiler import profile_execution
+from .synacor.resolver import resolve_indirect_branches
 
 Synacor.register()
 
@@ -15,6 +20,30 @@ arch.register_calling_convention(cc)
 arch.standalone_platform.default_calling_convention = cc
 
 SynacorView.register()
+SynacorSnapshotView.register()
+
+def is_synacor_view(view):
+    return view.arch is not None and view.arch.name == Synacor.name
+
+# Functions found through emulation are fed to static analysis in turn
+def discover_and_resolve(view):
+    discover_via_emulation(view, resolve_indirect_branches)
+
+PluginCommand.register(
+    'Synacor\\Discover functions via emulation',
+    'Runs the program in an emulator and feeds observed functions and '
+    'indirect branch targets back into analysis',
+    discover_and_resolve,
+    is_synacor_view
+)
+
+PluginCommand.register(
+    'Synacor\\Profile execution',
+    'Runs the program in an emulator, exports collapsed call stacks for '
+    'flamegraphs and annotates the hottest functions',
+    profile_execution,
+    is_synacor_view
+)
 
 # Since plugin load order is undefined, postpone the patching by a few seconds
 patch_timeout = Timer(2.0, patch_debugger)
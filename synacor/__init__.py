@@ -1,3 +1,3 @@
 from .arch import Synacor
 from .calling_convention import SynacorCallingConvention
-from .view import SynacorView
+from .view import SynacorSnapshotView, SynacorView
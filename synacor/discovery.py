@@ -0,0 +1,135 @@
+# pylint: disable = attribute-defined-outside-init
+
+from binaryninja import (
+    BackgroundTaskThread, HighlightStandardColor, interaction, log_info
+)
+
+from .emulator import EXHAUSTED, STEPPED, Coverage, Emulator, EmulatorError
+from .snapshot import save_snapshot
+from .utils import ADDRESS_SIZE as size
+
+# Upper bound on executed operations per run, keeping runs into the
+# teleporter check from spinning forever
+MAX_STEPS = 20000000
+
+# Operations executed between checks for cancellation of background tasks
+CHUNK_STEPS = 100000
+
+# Runs the emulator in chunks so that given background task can be cancelled,
+# returning the reason execution stopped
+def emulate(task, emulator, **kwargs):
+    while not task.cancelled:
+        max_steps = min(emulator.steps + CHUNK_STEPS, MAX_STEPS)
+        try:
+            reason = emulator.run(max_steps, **kwargs)
+        except EmulatorError as error:
+            return str(error)
+        if reason != STEPPED or max_steps == MAX_STEPS:
+            return reason
+        task.progress = '%s (%d steps)' % (task.title, emulator.steps)
+    return 'cancelled'
+
+def add_functions(view, entries):
+    for addr in sorted(entries):
+        if not view.get_function_at(addr):
+            view.add_function(addr)
+
+def add_indirect_branches(view, branches):
+    arch = view.arch
+    for (source, targets) in sorted(branches.items()):
+        for func in view.get_functions_containing(source):
+            known = set(branch.dest_addr for branch in func.get_indirect_branches_at(source))
+            if known.issuperset(targets):
+                continue
+            func.set_user_indirect_branches(
+                source, [(arch, addr) for addr in sorted(known | set(targets))]
+            )
+
+def add_call_refs(view, calls):
+    for (source, targets) in sorted(calls.items()):
+        for func in view.get_functions_containing(source):
+            for addr in targets:
+                func.add_user_code_ref(source, addr)
+
+# Snapshot views carry the machine state they were saved with
+def restore_state(view, emulator):
+    try:
+        ip = view.query_metadata('synacor.ip')
+    except KeyError:
+        return
+    registers = view.query_metadata('synacor.registers')
+    emulator.restore(
+        ip // size,
+        [registers['R%i' % i] for i in range(len(emulator.registers))],
+        view.query_metadata('synacor.stack')
+    )
+
+# Runs stopping for lack of input are a natural point to continue from later
+def offer_snapshot(emulator, reason):
+    if reason != EXHAUSTED:
+        return
+    path = interaction.get_save_filename_input('Save snapshot (optional)', 'synsnap')
+    if path:
+        with open(path, 'wb') as f:
+            save_snapshot(f, emulator)
+
+# Feeds everything observed during emulation back into the view in one go
+def apply_coverage(view, coverage):
+    add_functions(view, coverage.functions)
+    for targets in coverage.indirect_calls.values():
+        add_functions(view, targets)
+    # Indirect branches can only be attached to functions that exist, so let
+    # analysis catch up with the newly added ones first
+    view.update_analysis_and_wait()
+    add_indirect_branches(view, coverage.indirect_jumps)
+    add_call_refs(view, coverage.indirect_calls)
+    view.update_analysis_and_wait()
+    highlight_blocks(view, coverage.blocks)
+
+def highlight_blocks(view, blocks):
+    for addr in sorted(blocks):
+        for func in view.get_functions_containing(addr):
+            block = func.get_basic_block_at(addr)
+            if block is not None:
+                block.set_user_highlight(HighlightStandardColor.GreenHighlightColor)
+
+class CoverageDiscoveryTask(BackgroundTaskThread):
+    title = 'Emulating Synacor program...'
+
+    def __init__(self, view, stdin, applied=None):
+        BackgroundTaskThread.__init__(self, self.title, True)
+        self.view = view
+        self.stdin = stdin
+        self.applied = applied
+
+    def run(self):
+        program = self.view.read(self.view.start, len(self.view))
+        emulator = Emulator(program, self.stdin)
+        restore_state(self.view, emulator)
+        coverage = Coverage()
+        # Cancelling a long run still applies what was covered so far
+        reason = emulate(self, emulator, coverage=coverage)
+
+        log_info('Synacor emulation stopped after %d steps: %s' % (emulator.steps, reason))
+        offer_snapshot(emulator, reason)
+        log_info('Covered %d blocks, %d functions, %d indirect jumps, %d indirect calls' % (
+            len(coverage.blocks), len(coverage.functions),
+            len(coverage.indirect_jumps), len(coverage.indirect_calls),
+        ))
+
+        self.progress = 'Applying Synacor coverage...'
+        apply_coverage(self.view, coverage)
+        if self.applied is not None:
+            self.applied(self.view)
+
+# Input is optional; without it runs stop at the first `in` operation
+def read_input():
+    path = interaction.get_open_filename_input('Program input (optional)')
+    if not path:
+        return b''
+    with open(path, 'rb') as f:
+        return f.read()
+
+# Given callback is invoked with the view once coverage has been applied
+def discover_via_emulation(view, applied=None):
+    CoverageDiscoveryTask(view, read_input(), applied).start()
@@ -0,0 +1,346 @@
+import random
+import struct
+from array import array
+
+from .utils import (
+    ADDRESS_SIZE as size, LITERAL_MODULO, REGISTER_MIN, REGISTER_MAX
+)
+
+MEMORY_SIZE = LITERAL_MODULO
+
+# Stop reasons reported by Emulator.run
+HALTED    = 'halted'
+EXHAUSTED = 'input exhausted'
+STEPPED   = 'step limit reached'
+
+class EmulatorError(Exception):
+    pass
+
+# Records what a run actually executed: how often every basic block was
+# entered, which functions were called and where register-indirect jumps and
+# calls went. All addresses are byte addresses, as used by Binary Ninja.
+class Coverage(object):
+    def __init__(self):
+        self.blocks = {}
+        self.functions = set()
+        self.indirect_jumps = {}
+        self.indirect_calls = {}
+
+    def hit(self, addr):
+        self.blocks[addr] = self.blocks.get(addr, 0) + 1
+
+    def indirect(self, table, source, target):
+        table.setdefault(source * size, set()).add(target * size)
+
+# Counts executed operations per ip and per call stack, the latter
+# reconstructed from call/ret. Call stacks are interned as nodes of a call tree
+# (parent node and frame), so entering or leaving a function costs the same
+# regardless of depth; full stacks are only expanded when exporting. Counts
+# are only recorded about every `interval` operations (weighted by the actual
+# period) to keep very long runs cheap, with periods jittered so samples do
+# not lock onto loops of matching length. Counts are attributed to the current
+# node lazily whenever it changes.
+class Profile(object): # pylint: disable = too-many-instance-attributes
+    def __init__(self, interval=1):
+        self.interval = interval
+        self.ips = array('L', [0] * MEMORY_SIZE)
+        self.nodes = {}
+        self.parents = []
+        self.frames = []
+        self.counts = []
+        self.node = None
+        self.random = random.Random()
+        self.period = 0
+        self.countdown = 0
+        self.pending = 0
+        self.reload()
+
+    @property
+    def total(self):
+        return sum(self.counts) + self.pending
+
+    def intern(self, parent, frame):
+        key = (parent, frame)
+        node = self.nodes.get(key)
+        if node is None:
+            node = len(self.parents)
+            self.nodes[key] = node
+            self.parents.append(parent)
+            self.frames.append(frame)
+            self.counts.append(0)
+        return node
+
+    def start(self, ip):
+        if self.node is None:
+            self.node = self.intern(-1, ip * size)
+
+    def reload(self):
+        jitter = self.interval // 2
+        self.period = self.interval + self.random.randint(-jitter, jitter)
+        self.countdown = self.period
+
+    def tick(self, ip):
+        self.countdown -= 1
+        if self.countdown:
+            return
+        self.ips[ip] += self.period
+        self.pending += self.period
+        self.reload()
+
+    def flush(self):
+        if self.pending:
+            self.counts[self.node] += self.pending
+            self.pending = 0
+
+    def enter(self, target):
+        self.flush()
+        self.node = self.intern(self.node, target * size)
+
+    def leave(self):
+        self.flush()
+        # Never drop the outermost frame, unbalanced returns are common in
+        # hand-written Synacor code
+        parent = self.parents[self.node]
+        if parent >= 0:
+            self.node = parent
+
+    def stack(self, node):
+        frames = []
+        while node >= 0:
+            frames.append(self.frames[node])
+            node = self.parents[node]
+        frames.reverse()
+        return frames
+
+    # Operations executed in each frame including its callees, counting
+    # recursive invocations only once
+    def inclusive(self):
+        self.flush()
+        subtree = list(self.counts)
+        children = [[] for _ in self.parents]
+        for node in reversed(range(len(self.parents))):
+            parent = self.parents[node]
+            if parent >= 0:
+                subtree[parent] += subtree[node]
+                children[parent].append(node)
+
+        inclusive = {}
+        active = {}
+        pending = [(node, False) for (node, parent) in enumerate(self.parents) if parent < 0]
+        while pending:
+            node, leaving = pending.pop()
+            frame = self.frames[node]
+            if leaving:
+                active[frame] -= 1
+                continue
+            if not active.get(frame):
+                inclusive[frame] = inclusive.get(frame, 0) + subtree[node]
+            active[frame] = active.get(frame, 0) + 1
+            pending.append((node, True))
+            pending.extend((child, False) for child in children[node])
+        return inclusive
+
+    # Writes stacks in the collapsed format consumed by flamegraph.pl and
+    # compatible tools, one `frame;frame;frame count` line per stack. Direct
+    # recursion is merged into a single frame by default, as deeply recursive
+    # routines would otherwise yield lines as long as the recursion is deep.
+    def write_collapsed(self, f, name=None, merge_recursion=True):
+        self.flush()
+        name = name or (lambda addr: 'sub_%x' % addr)
+
+        merged = Profile()
+        mapping = []
+        for (node, parent) in enumerate(self.parents):
+            frame = self.frames[node]
+            if parent < 0:
+                mapping.append(merged.intern(-1, frame))
+            elif merge_recursion and frame == self.frames[parent]:
+                mapping.append(mapping[parent])
+            else:
+                mapping.append(merged.intern(mapping[parent], frame))
+            merged.counts[mapping[node]] += self.counts[node]
+
+        names = {}
+        for (node, count) in enumerate(merged.counts):
+            if not count:
+                continue
+            frames = []
+            for addr in merged.stack(node):
+                if addr not in names:
+                    names[addr] = name(addr)
+                frames.append(names[addr])
+            f.write(('%s %d\n' % (';'.join(frames), count)).encode())
+
+class Emulator(object): # pylint: disable = too-many-instance-attributes
+    def __init__(self, program, stdin=b''):
+        words = len(program) // size
+        self.memory = array('H', struct.unpack('<%iH' % words, program[:words * size]))
+        # Trailing padding ensures operand fetches near the end never run short
+        self.memory.extend([0] * (MEMORY_SIZE + 4 - len(self.memory)))
+        self.registers = [0] * (REGISTER_MAX - REGISTER_MIN + 1)
+        self.stack = []
+        self.ip = 0
+        self.steps = 0
+        self.stdin = bytearray(stdin)
+        self.stdout = bytearray()
+        self.coverage = None
+        self.profile = None
+
+    def restore(self, ip, registers, stack):
+        self.ip = ip
+        self.registers = list(registers)
+        self.stack = list(stack)
+
+    def value(self, raw):
+        if raw >= REGISTER_MIN:
+            if raw > REGISTER_MAX:
+                raise EmulatorError('Invalid operand 0x%04x at 0x%04x' % (raw, self.ip * size))
+            return self.registers[raw - REGISTER_MIN]
+        return raw
+
+    def store(self, raw, value):
+        if not REGISTER_MIN <= raw <= REGISTER_MAX:
+            raise EmulatorError('Invalid register operand 0x%04x at 0x%04x' % (raw, self.ip * size))
+        self.registers[raw - REGISTER_MIN] = value
+
+    # Runs until execution stops or the total number of executed operations
+    # reaches max_steps; runs may be resumed by calling run again
+    def run(self, max_steps=None, coverage=None, profile=None):
+        self.coverage = coverage
+        if coverage is not None and self.steps == 0:
+            coverage.hit(self.ip * size)
+            coverage.functions.add(self.ip * size)
+        self.profile = profile
+        if profile is not None:
+            profile.start(self.ip)
+
+        try:
+            while max_steps is None or self.steps < max_steps:
+                reason = self.step()
+                if reason is not None:
+                    return reason
+            return STEPPED
+        except IndexError:
+            raise EmulatorError('Memory access out of bounds at 0x%04x' % (self.ip * size))
+        finally:
+            if profile is not None:
+                profile.flush()
+
+    # Executes a single operation, returning a stop reason when execution
+    # cannot continue
+    # pylint: disable = too-many-branches, too-many-statements
+    def step(self):
+        memory = self.memory
+        ip = self.ip
+        if ip >= MEMORY_SIZE:
+            raise EmulatorError('Execution ran past end of memory at 0x%04x' % (ip * size))
+        opcode = memory[ip]
+        a, b, c = memory[ip + 1:ip + 4]
+        coverage = self.coverage
+        profile = self.profile
+        branched = False
+
+        if profile is not None:
+            profile.tick(ip)
+
+        if opcode == 0: # halt
+            return HALTED
+
+        if opcode == 1: # set
+            self.store(a, self.value(b))
+            ip += 3
+        elif opcode == 2: # push
+            self.stack.append(self.value(a))
+            ip += 2
+        elif opcode == 3: # pop
+            if not self.stack:
+                raise EmulatorError('Pop from empty stack at 0x%04x' % (ip * size))
+            self.store(a, self.stack.pop())
+            ip += 2
+        elif opcode == 4: # eq
+            self.store(a, int(self.value(b) == self.value(c)))
+            ip += 4
+        elif opcode == 5: # gt
+            self.store(a, int(self.value(b) > self.value(c)))
+            ip += 4
+        elif opcode == 6: # jmp
+            target = self.value(a)
+            if coverage is not None and a >= REGISTER_MIN:
+                coverage.indirect(coverage.indirect_jumps, ip, target)
+            ip = target
+            branched = True
+        elif opcode in (7, 8): # jt, jf
+            if (self.value(a) != 0) == (opcode == 7):
+                target = self.value(b)
+                if coverage is not None and b >= REGISTER_MIN:
+                    coverage.indirect(coverage.indirect_jumps, ip, target)
+                ip = target
+            else:
+                ip += 3
+            branched = True
+        elif opcode == 9: # add
+            self.store(a, (self.value(b) + self.value(c)) % LITERAL_MODULO)
+            ip += 4
+        elif opcode == 10: # mult
+            self.store(a, (self.value(b) * self.value(c)) % LITERAL_MODULO)
+            ip += 4
+        elif opcode == 11: # mod
+            divisor = self.value(c)
+            if not divisor:
+                raise EmulatorError('Modulo by zero at 0x%04x' % (ip * size))
+            self.store(a, self.value(b) % divisor)
+            ip += 4
+        elif opcode == 12: # and
+            self.store(a, self.value(b) & self.value(c))
+            ip += 4
+        elif opcode == 13: # or
+            self.store(a, self.value(b) | self.value(c))
+            ip += 4
+        elif opcode == 14: # not
+            self.store(a, ~self.value(b) & 0x7FFF)
+            ip += 3
+        elif opcode == 15: # rmem
+            self.store(a, memory[self.value(b)])
+            ip += 3
+        elif opcode == 16: # wmem
+            memory[self.value(a)] = self.value(b)
+            ip += 3
+        elif opcode == 17: # call
+            target = self.value(a)
+            if coverage is not None:
+                if a >= REGISTER_MIN:
+                    coverage.indirect(coverage.indirect_calls, ip, target)
+                coverage.functions.add(target * size)
+            if profile is not None:
+                profile.enter(target)
+            self.stack.append(ip + 2)
+            ip = target
+            branched = True
+        elif opcode == 18: # ret
+            if not self.stack:
+                return HALTED
+            ip = self.stack.pop()
+            if profile is not None:
+                profile.leave()
+            branched = True
+        elif opcode == 19: # out
+            char = self.value(a)
+            if char > 0xFF:
+                raise EmulatorError('Invalid character 0x%04x at 0x%04x' % (char, ip * size))
+            self.stdout.append(char)
+            ip += 2
+        elif opcode == 20: # in
+            if not self.stdin:
+                return EXHAUSTED
+            self.store(a, self.stdin.pop(0))
+            ip += 2
+        elif opcode == 21: # noop
+            ip += 1
+        else:
+            raise EmulatorError('Invalid opcode 0x%04x at 0x%04x' % (opcode, ip * size))
+
+        self.ip = ip
+        self.steps += 1
+        if branched and coverage is not None:
+            coverage.hit(ip * size)
+        return None
@@ -0,0 +1,103 @@
+from binaryninja import (
+    BackgroundTaskThread, interaction, log_info
+)
+
+from .discovery import emulate, offer_snapshot, read_input, restore_state
+from .emulator import Emulator, Profile
+from .utils import ADDRESS_SIZE as size
+
+# Number of hottest functions to annotate
+HOT_FUNCTIONS = 20
+
+# Tag type marking hot functions, replaced on every profiling run
+HOT_TAG = 'Hot'
+HOT_ICON = u'\U0001F525'
+
+def frame_name(view, addr):
+    func = view.get_function_at(addr)
+    if func is None:
+        return 'sub_%x' % addr
+    return func.name
+
+# Shared basic blocks make an ip part of several functions; the one starting
+# closest before it is considered to own it
+def owning_function(view, addr):
+    funcs = [func for func in view.get_functions_containing(addr) if func.start <= addr]
+    if not funcs:
+        return None
+    return max(funcs, key=lambda func: func.start)
+
+def hot_tag_type(view):
+    tag_type = view.tag_types.get(HOT_TAG)
+    if tag_type is None:
+        tag_type = view.create_tag_type(HOT_TAG, HOT_ICON)
+    for func in view.functions:
+        for tag in func.function_tags:
+            if tag.type == tag_type:
+                func.remove_user_function_tag(tag)
+    return tag_type
+
+# Attributes executed operations to functions in the view, both exclusively
+# (per ip) and inclusively (per call stack), and tags the hottest ones
+def annotate_profile(view, profile):
+    total = profile.total
+    if not total:
+        return
+
+    exclusive = {}
+    unattributed = 0
+    for (ip, count) in enumerate(profile.ips):
+        if not count:
+            continue
+        func = owning_function(view, ip * size)
+        if func is None:
+            unattributed += count
+            continue
+        exclusive[func.start] = exclusive.get(func.start, 0) + count
+
+    inclusive = profile.inclusive()
+    tag_type = hot_tag_type(view)
+
+    hottest = sorted(exclusive.items(), key=lambda item: -item[1])[:HOT_FUNCTIONS]
+    for (addr, count) in hottest:
+        func = view.get_function_at(addr)
+        data = '%d operations (%.1f%%) executed here, %d including callees' % (
+            count, 100.0 * count / total, inclusive.get(addr, count)
+        )
+        func.create_user_function_tag(tag_type, data)
+        log_info('%-24s %10d %5.1f%%' % (func.name, count, 100.0 * count / total))
+    if unattributed:
+        share = 100.0 * unattributed / total
+        log_info('%-24s %10d %5.1f%%' % ('(outside functions)', unattributed, share))
+
+class ProfilerTask(BackgroundTaskThread):
+    title = 'Profiling Synacor program...'
+
+    def __init__(self, view, stdin, interval, output):
+        BackgroundTaskThread.__init__(self, self.title, True)
+        self.view = view
+        self.stdin = stdin
+        self.interval = interval
+        self.output = output
+
+    def run(self):
+        program = self.view.read(self.view.start, len(self.view))
+        emulator = Emulator(program, self.stdin)
+        restore_state(self.view, emulator)
+        profile = Profile(self.interval)
+        # Cancelling a long run still reports what was profiled so far
+        reason = emulate(self, emulator, profile=profile)
+
+        log_info('Synacor profiling stopped after %d steps: %s' % (emulator.steps, reason))
+        offer_snapshot(emulator, reason)
+
+        if self.output:
+            with open(self.output, 'wb') as f:
+                profile.write_collapsed(f, lambda addr: frame_name(self.view, addr))
+        annotate_profile(self.view, profile)
+
+def profile_execution(view):
+    stdin = read_input()
+    interval = interaction.get_int_input('Sampling interval (operations)', 'Synacor profiler')
+    output = interaction.get_save_filename_input('Collapsed stacks output (optional)', 'folded')
+    ProfilerTask(view, stdin, max(interval or 1, 1), output).start()
@@ -0,0 +1,63 @@
+import struct
+import time
+
+from binaryninja import BackgroundTaskThread, log_info
+
+from .discovery import add_call_refs, add_functions, add_indirect_branches
+from .utils import ADDRESS_SIZE as size
+from .vsa import REGISTER_COUNT, ValueSetAnalysis
+
+# Snapshot views carry the registers they were saved with, programs start
+# with all registers cleared
+def entry_registers(view):
+    try:
+        registers = view.query_metadata('synacor.registers')
+    except KeyError:
+        return [0] * REGISTER_COUNT
+    return [registers['R%i' % i] for i in range(REGISTER_COUNT)]
+
+def add_data_refs(view, accesses):
+    for (source, targets) in sorted(accesses.items()):
+        for addr in targets:
+            view.add_user_data_ref(source, addr)
+
+class ValueSetAnalysisTask(BackgroundTaskThread):
+    title = 'Resolving Synacor indirect branches...'
+
+    def __init__(self, view):
+        BackgroundTaskThread.__init__(self, self.title, False)
+        self.view = view
+
+    def run(self):
+        view = self.view
+        started = time.time()
+        data = view.read(view.start, len(view))
+        words = len(data) // size
+        vsa = ValueSetAnalysis(struct.unpack('<%iH' % words, data[:words * size]))
+
+        # Functions found by other means (emulation, the user) are analysed
+        # as well, knowing nothing about their callers
+        entry = view.entry_point
+        vsa.seed(entry, entry_registers(view))
+        for func in view.functions:
+            if func.start != entry:
+                vsa.seed(func.start)
+        vsa.run()
+
+        log_info('Synacor value-set analysis resolved %d indirect branches in %.3fs' % (
+            len(vsa.targets), time.time() - started
+        ))
+
+        jumps = vsa.jumps
+        calls = dict(
+            (addr, targets) for (addr, targets) in vsa.targets.items() if addr not in jumps
+        )
+        add_functions(view, vsa.functions)
+        view.update_analysis_and_wait()
+        add_indirect_branches(view, jumps)
+        add_call_refs(view, calls)
+        add_data_refs(view, vsa.accesses)
+        view.update_analysis()
+
+def resolve_indirect_branches(view):
+    ValueSetAnalysisTask(view).start()
@@ -0,0 +1,65 @@
+import struct
+
+from .emulator import MEMORY_SIZE
+from .utils import ADDRESS_SIZE as size
+
+# Snapshot layout, all values little-endian:
+#   magic 'SYNS', version, ip, registers R0-R7, memory length (in words),
+#   stack depth, followed by the memory image and finally the stack (bottom
+#   first). Memory directly follows the fixed-size header, so views can map
+#   it straight from the file without copying.
+MAGIC = b'SYNS'
+VERSION = 1
+HEADER = struct.Struct('<4sHH8HHI')
+MEMORY_OFFSET = HEADER.size
+
+class Snapshot(object):
+    def __init__(self, ip, registers, memory_length, stack_depth):
+        self.ip = ip
+        self.registers = registers
+        self.memory_length = memory_length
+        self.stack_depth = stack_depth
+
+    @property
+    def memory_size(self):
+        return self.memory_length * size
+
+    @property
+    def stack_offset(self):
+        return MEMORY_OFFSET + self.memory_size
+
+    @property
+    def end(self):
+        return self.stack_offset + self.stack_depth * size
+
+    @staticmethod
+    def is_snapshot(header):
+        return header[:len(MAGIC)] == MAGIC
+
+    # Parses the header only; the stack is read lazily through read_stack
+    @classmethod
+    def parse(cls, header):
+        if len(header) < HEADER.size or not cls.is_snapshot(header):
+            raise ValueError('Not a Synacor snapshot')
+        fields = HEADER.unpack(header[:HEADER.size])
+        version, ip = fields[1:3]
+        if version != VERSION:
+            raise ValueError('Unsupported Synacor snapshot version %d' % version)
+        registers = list(fields[3:11])
+        memory_length, stack_depth = fields[11:13]
+        if memory_length > MEMORY_SIZE:
+            raise ValueError('Synacor snapshot memory exceeds address space')
+        return cls(ip, registers, memory_length, stack_depth)
+
+    def read_stack(self, read):
+        data = read(self.stack_offset, self.stack_depth * size)
+        return list(struct.unpack('<%iH' % self.stack_depth, data))
+
+def save_snapshot(f, emulator):
+    memory = emulator.memory[:MEMORY_SIZE]
+    stack = emulator.stack
+    f.write(HEADER.pack(
+        MAGIC, VERSION, emulator.ip, *(list(emulator.registers) + [len(memory), len(stack)])
+    ))
+    f.write(struct.pack('<%iH' % len(memory), *memory))
+    f.write(struct.pack('<%iH' % len(stack), *stack))
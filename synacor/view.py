@@ -4,6 +4,10 @@ from binaryninja import (
     Architecture, BinaryView, SectionSemantics, SegmentFlag as Flag
 )
 
+from .resolver import resolve_indirect_branches
+from .snapshot import HEADER, MEMORY_OFFSET, Snapshot
+from .utils import ADDRESS_SIZE as size
+
 class SynacorView(BinaryView):
     name = 'Synacor'
     long_name = 'Synacor Program'
@@ -17,25 +21,66 @@ class SynacorView(BinaryView):
     def __init__(self, data):
         BinaryView.__init__(self, parent_view=data, file_metadata=data.file)
         self.raw = data
+        self.entry_addr = 0
 
     def init(self):
+        self.map_program(0, len(self.raw))
+        self.add_entry_point(0)
+        self.resolve_on_completion()
+        return True
+
+    def map_program(self, offset, length):
         self.arch = Architecture['Synacor']
         self.platform = Architecture['Synacor'].standalone_platform
 
         self.add_auto_segment(
-            0, len(self.raw), # entire program is self-modifiable
-            0, len(self.raw),
+            0, length, # entire program is self-modifiable
+            offset, length,
             Flag.SegmentReadable | Flag.SegmentExecutable | Flag.SegmentWritable
         )
 
         # TODO: Is this correct?
         self.add_user_section(
-            'synacor', 0, len(self.raw),
+            'synacor', 0, length,
             SectionSemantics.ReadOnlyCodeSectionSemantics
         )
 
-        self.add_entry_point(0)
-        return True
+    # Resolves register-indirect branches statically once initial analysis
+    # has completed, keeping view loading itself instant
+    def resolve_on_completion(self):
+        self.vsa_completion = self.add_analysis_completion_event(
+            lambda: resolve_indirect_branches(self)
+        )
+
+    def perform_get_entry_point(self):
+        return self.entry_addr
 
     def perform_is_executable(self):
         return True
+
+class SynacorSnapshotView(SynacorView):
+    name = 'SynacorSnapshot'
+    long_name = 'Synacor Snapshot'
+
+    @classmethod
+    def is_valid_for_data(cls, data):
+        try:
+            snapshot = Snapshot.parse(data.read(0, HEADER.size))
+        except ValueError:
+            return False
+        return snapshot.end <= len(data)
+
+    def init(self):
+        snapshot = Snapshot.parse(self.raw.read(0, HEADER.size))
+        self.entry_addr = snapshot.ip * size
+
+        # Memory image is backed by the snapshot file itself rather than copied
+        self.map_program(MEMORY_OFFSET, snapshot.memory_size)
+        self.add_entry_point(self.entry_addr)
+
+        registers = dict(('R%i' % i, value) for (i, value) in enumerate(snapshot.registers))
+        self.store_metadata('synacor.registers', registers)
+        self.store_metadata('synacor.stack', snapshot.read_stack(self.raw.read))
+        self.store_metadata('synacor.ip', self.entry_addr)
+        self.resolve_on_completion()
+        return True
@@ -0,0 +1,413 @@
+# pylint: disable = too-many-branches, too-many-instance-attributes, too-many-locals
+# pylint: disable = too-many-return-statements, too-many-statements
+
+from collections import deque
+
+from .utils import (
+    ADDRESS_SIZE as size, LITERAL_MAX, LITERAL_MODULO, REGISTER_MIN, REGISTER_MAX
+)
+
+# Abstract register values are either a frozenset of at most MAX_SET concrete
+# values or an inclusive (lo, hi) interval when there are more
+MAX_SET = 32
+TOP = (0, LITERAL_MAX)
+REGISTER_COUNT = REGISTER_MAX - REGISTER_MIN + 1
+
+# Joins at a single address after which changing registers are widened to TOP,
+# guaranteeing termination for loops counting through large ranges
+WIDEN_AFTER = 8
+
+def normalize(lo, hi):
+    if lo > hi:
+        return None
+    if hi - lo < MAX_SET:
+        return frozenset(range(lo, hi + 1))
+    return (lo, hi)
+
+def from_values(values):
+    values = frozenset(values)
+    if not values:
+        return None
+    if len(values) <= MAX_SET:
+        return values
+    return normalize(min(values), max(values))
+
+def bounds(value):
+    if isinstance(value, frozenset):
+        return (min(value), max(value))
+    return value
+
+def join(a, b):
+    if a == b:
+        return a
+    if isinstance(a, frozenset) and isinstance(b, frozenset):
+        return from_values(a | b)
+    (alo, ahi), (blo, bhi) = bounds(a), bounds(b)
+    return normalize(min(alo, blo), max(ahi, bhi))
+
+def intersect(value, lo, hi):
+    if isinstance(value, frozenset):
+        return from_values(v for v in value if lo <= v <= hi)
+    vlo, vhi = value
+    return normalize(max(vlo, lo), min(vhi, hi))
+
+def exclude(value, excluded):
+    if isinstance(value, frozenset):
+        return from_values(value - frozenset([excluded]))
+    lo, hi = value
+    if lo == excluded:
+        lo += 1
+    if hi == excluded:
+        hi -= 1
+    return normalize(lo, hi)
+
+def is_zero(value):
+    return value == frozenset([0])
+
+def is_nonzero(value):
+    return bounds(value)[0] > 0
+
+def mask(value):
+    bits = 0
+    while value >> bits:
+        bits += 1
+    return (1 << bits) - 1
+
+# Applies a concrete operation to every combination of values when sets are
+# small enough, falling back to interval arithmetic otherwise
+def binary(a, b, concrete, interval):
+    sets = isinstance(a, frozenset) and isinstance(b, frozenset)
+    if sets and len(a) * len(b) <= MAX_SET * MAX_SET:
+        return from_values(concrete(x, y) for x in a for y in b) or TOP
+    return interval(bounds(a), bounds(b)) or TOP
+
+def interval_add(a, b):
+    lo, hi = a[0] + b[0], a[1] + b[1]
+    if hi < LITERAL_MODULO:
+        return normalize(lo, hi)
+    if lo >= LITERAL_MODULO:
+        return normalize(lo - LITERAL_MODULO, hi - LITERAL_MODULO)
+    return TOP
+
+def interval_mult(a, b):
+    if a[1] * b[1] < LITERAL_MODULO:
+        return normalize(a[0] * b[0], a[1] * b[1])
+    return TOP
+
+def interval_mod(a, b):
+    if b[0] == 0:
+        return TOP
+    return normalize(0, min(a[1], b[1] - 1))
+
+def interval_and(a, b):
+    return normalize(0, min(a[1], b[1]))
+
+def interval_or(a, b):
+    return normalize(max(a[0], b[0]), mask(max(a[1], b[1])))
+
+def interval_eq(a, b):
+    if a[1] < b[0] or b[1] < a[0]:
+        return frozenset([0])
+    return frozenset([0, 1])
+
+def interval_gt(a, b):
+    if a[0] > b[1]:
+        return frozenset([1])
+    if a[1] <= b[0]:
+        return frozenset([0])
+    return frozenset([0, 1])
+
+def safe_mod(x, y):
+    return x % y if y else 0
+
+# Opcodes and their operand counts as listed in ARCH-SPEC.txt; like the
+# emulator, the analysis decodes raw words rather than going through the
+# operation classes, keeping it usable outside of Binary Ninja
+(HALT, SET, PUSH, POP, EQ, GT, JMP, JT, JF, ADD, MULT, MOD, AND, OR, NOT,
+ RMEM, WMEM, CALL, RET, OUT, IN, NOOP) = range(22)
+OPERAND_COUNTS = (0, 2, 1, 1, 3, 3, 1, 2, 2, 3, 3, 3, 3, 3, 2, 2, 2, 1, 0, 1, 1, 0)
+
+ARITHMETIC = {
+    ADD: (lambda x, y: (x + y) % LITERAL_MODULO, interval_add),
+    MULT: (lambda x, y: (x * y) % LITERAL_MODULO, interval_mult),
+    MOD: (safe_mod, interval_mod),
+    AND: (lambda x, y: x & y, interval_and),
+    OR: (lambda x, y: x | y, interval_or),
+    EQ: (lambda x, y: int(x == y), interval_eq),
+    GT: (lambda x, y: int(x > y), interval_gt),
+}
+
+# Worklist-based value-set analysis over R0-R7, run directly on the decoded
+# memory image. Besides value sets, registers holding the outcome of `eq` or
+# `gt` against a literal remember that predicate, so that `jt`/`jf` on them
+# can narrow the compared register on each edge (as bounds checks in front of
+# jump tables do). Loads only yield values from the image when no store may
+# have written the loaded address, with stores through unresolved addresses
+# covering their whole interval. Calls are not assumed to preserve any
+# register, as nothing in Synacor code enforces a calling convention.
+#
+# Analysis starts from seeded entry points, either with known register values
+# (as at the program entry) or with all registers unknown (as at functions
+# found by other means).
+#
+# Results are keyed by byte address, as used by Binary Ninja:
+#   targets   resolved targets of register-indirect jmp, jt, jf and call
+#   jumps     the subset of targets belonging to jmp, jt and jf
+#   accesses  resolved memory addresses of register operands to rmem and wmem
+#   functions call destinations
+class ValueSetAnalysis(object):
+    def __init__(self, memory):
+        self.memory = memory
+
+        self.states = {}
+        self.visits = {}
+        self.worklist = deque()
+        self.queued = set()
+        self.written = set()
+        self.written_ranges = []
+        self.loads = {}
+
+        self.resolved = {}
+        self.unresolved = set()
+        self.functions = set()
+
+    @property
+    def targets(self):
+        return self.results(JMP, JT, JF, CALL)
+
+    @property
+    def jumps(self):
+        return self.results(JMP, JT, JF)
+
+    @property
+    def accesses(self):
+        return self.results(RMEM, WMEM)
+
+    def results(self, *opcodes):
+        results = {}
+        for ((addr, opcode), values) in self.resolved.items():
+            if opcode in opcodes and (addr, opcode) not in self.unresolved:
+                results[addr * size] = sorted(value * size for value in values)
+        return results
+
+    # Registers default to unknown; known values are given as a list of eight
+    def seed(self, entry, registers=None):
+        if registers is None:
+            regs = (TOP,) * REGISTER_COUNT
+        else:
+            regs = tuple(from_values([value]) for value in registers)
+        self.propagate(entry // size, (regs, (None,) * REGISTER_COUNT))
+        return self
+
+    def run(self):
+        while self.worklist:
+            addr = self.worklist.popleft()
+            self.queued.discard(addr)
+            self.transfer(addr, self.states[addr])
+        return self
+
+    def push(self, addr):
+        if addr not in self.queued:
+            self.queued.add(addr)
+            self.worklist.append(addr)
+
+    def propagate(self, addr, state):
+        if state is None or not 0 <= addr < len(self.memory):
+            return
+        old = self.states.get(addr)
+        if old is None:
+            self.states[addr] = state
+            self.push(addr)
+            return
+
+        visits = self.visits.get(addr, 0) + 1
+        self.visits[addr] = visits
+        (old_regs, old_preds), (regs, preds) = old, state
+        new_regs = tuple(join(o, n) for (o, n) in zip(old_regs, regs))
+        if visits > WIDEN_AFTER:
+            new_regs = tuple(o if o == n else TOP for (o, n) in zip(old_regs, new_regs))
+        new_preds = tuple(o if o == n else None for (o, n) in zip(old_preds, preds))
+        new = (new_regs, new_preds)
+        if new != old:
+            self.states[addr] = new
+            self.push(addr)
+
+    def record(self, addr, opcode, raw, value):
+        if raw < REGISTER_MIN:
+            return
+        key = (addr, opcode)
+        if not isinstance(value, frozenset):
+            self.unresolved.add(key)
+            return
+        self.resolved[key] = self.resolved.get(key, frozenset()) | value
+
+    def transfer(self, addr, state):
+        memory = self.memory
+        opcode = memory[addr]
+        if opcode >= len(OPERAND_COUNTS):
+            return
+        count = OPERAND_COUNTS[opcode]
+        operands = memory[addr + 1:addr + 1 + count]
+        if len(operands) < count or any(raw > REGISTER_MAX for raw in operands):
+            return
+
+        regs, preds = state
+        def value(raw):
+            if raw >= REGISTER_MIN:
+                return regs[raw - REGISTER_MIN]
+            return frozenset([raw])
+
+        def assign(raw, result, pred=None):
+            if raw < REGISTER_MIN:
+                return None
+            reg = raw - REGISTER_MIN
+            new_regs = list(regs)
+            new_regs[reg] = result
+            new_preds = [None if p is not None and p[1] == reg else p for p in preds]
+            new_preds[reg] = pred
+            return (tuple(new_regs), tuple(new_preds))
+
+        following = addr + 1 + count
+
+        if opcode in (HALT, RET):
+            return
+
+        if opcode == SET:
+            a, b = operands
+            self.propagate(following, assign(a, value(b)))
+        elif opcode in (POP, IN):
+            a, = operands
+            self.propagate(following, assign(a, TOP))
+        elif opcode == NOT:
+            a, b = operands
+            b = value(b)
+            if isinstance(b, frozenset):
+                result = from_values(~x & 0x7FFF for x in b)
+            else:
+                result = normalize(0x7FFF - b[1], 0x7FFF - b[0])
+            self.propagate(following, assign(a, result))
+        elif opcode in ARITHMETIC:
+            a, b, c = operands
+            concrete, interval = ARITHMETIC[opcode]
+            result = binary(value(b), value(c), concrete, interval)
+            self.propagate(following, assign(a, result, self.predicate(opcode, a, b, c)))
+        elif opcode == RMEM:
+            a, b = operands
+            address = value(b)
+            self.record(addr, opcode, b, address)
+            self.propagate(following, assign(a, self.load(addr, address)))
+        elif opcode == WMEM:
+            a, _ = operands
+            address = value(a)
+            self.record(addr, opcode, a, address)
+            self.store(address)
+            self.propagate(following, state)
+        elif opcode == JMP:
+            a, = operands
+            for target in self.branch(addr, opcode, a, value(a)):
+                self.propagate(target, state)
+        elif opcode in (JT, JF):
+            a, b = operands
+            jump_if = opcode == JT
+            taken = self.condition(a, value(a), jump_if, regs, preds)
+            if taken is not None:
+                for target in self.branch(addr, opcode, b, value(b)):
+                    self.propagate(target, taken)
+            self.propagate(following, self.condition(a, value(a), not jump_if, regs, preds))
+        elif opcode == CALL:
+            a, = operands
+            for target in self.branch(addr, opcode, a, value(a)):
+                self.functions.add(target * size)
+                self.propagate(target, state)
+            self.propagate(following, ((TOP,) * REGISTER_COUNT, (None,) * REGISTER_COUNT))
+        else:
+            self.propagate(following, state)
+
+    def branch(self, addr, opcode, raw, target):
+        self.record(addr, opcode, raw, target)
+        if not isinstance(target, frozenset):
+            return ()
+        return target
+
+    # Remembers `eq`/`gt` comparisons of a register against a literal, unless
+    # the result overwrites the compared register itself
+    def predicate(self, opcode, a, b, c):
+        if opcode not in (EQ, GT) or a in (b, c):
+            return None
+        if c < REGISTER_MIN <= b:
+            return (opcode, b - REGISTER_MIN, c, True)
+        if b < REGISTER_MIN <= c:
+            return (opcode, c - REGISTER_MIN, b, False)
+        return None
+
+    # Returns the state on the edge where <raw> is nonzero (or zero), or None
+    # when that edge is infeasible
+    def condition(self, raw, cond, nonzero, regs, preds):
+        if (nonzero and is_zero(cond)) or (not nonzero and is_nonzero(cond)):
+            return None
+        if raw < REGISTER_MIN:
+            return (regs, preds)
+
+        reg = raw - REGISTER_MIN
+        regs = list(regs)
+        regs[reg] = exclude(cond, 0) if nonzero else frozenset([0])
+
+        pred = preds[reg]
+        if pred is not None:
+            opcode, other, literal, left = pred
+            current = regs[other]
+            if opcode == EQ:
+                if nonzero:
+                    narrowed = intersect(current, literal, literal)
+                else:
+                    narrowed = exclude(current, literal)
+            elif left:
+                if nonzero:
+                    narrowed = intersect(current, literal + 1, LITERAL_MAX)
+                else:
+                    narrowed = intersect(current, 0, literal)
+            else:
+                if nonzero:
+                    narrowed = intersect(current, 0, literal - 1)
+                else:
+                    narrowed = intersect(current, literal, LITERAL_MAX)
+            if narrowed is None:
+                return None
+            regs[other] = narrowed
+        return (tuple(regs), preds)
+
+    def load(self, addr, address):
+        if not isinstance(address, frozenset):
+            return TOP
+        for location in address:
+            self.loads.setdefault(location, set()).add(addr)
+        if any(self.is_written(location) for location in address):
+            return TOP
+        memory = self.memory
+        values = [memory[location] if location < len(memory) else 0 for location in address]
+        if max(values) > LITERAL_MAX:
+            return TOP
+        return from_values(values)
+
+    def is_written(self, location):
+        if location in self.written:
+            return True
+        return any(lo <= location <= hi for (lo, hi) in self.written_ranges)
+
+    # Loads of locations that turn out to be written are revisited
+    def store(self, address):
+        if isinstance(address, frozenset):
+            for location in address - self.written:
+                self.written.add(location)
+                for site in self.loads.get(location, ()):
+                    self.push(site)
+            return
+
+        lo, hi = address
+        if any(rlo <= lo and hi <= rhi for (rlo, rhi) in self.written_ranges):
+            return
+        self.written_ranges.append(address)
+        for (location, sites) in self.loads.items():
+            if lo <= location <= hi:
+                for site in sites:
+                    self.push(site)
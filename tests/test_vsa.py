@@ -0,0 +1,105 @@
+import os
+import sys
+import types
+import unittest
+
+# Loads the synacor package on its own, as its parent is a Binary Ninja
+# plugin whose __init__ requires Binary Ninja
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+if 'synacor' not in sys.modules:
+    package = types.ModuleType('synacor')
+    package.__path__ = [os.path.join(ROOT, 'synacor')]
+    sys.modules['synacor'] = package
+
+# pylint: disable = import-error, wrong-import-position
+from synacor.vsa import TOP, ValueSetAnalysis
+
+R0, R1, R2, R3 = 32768, 32769, 32770, 32771
+
+def analyse(words, *seeds):
+    memory = list(words) + [0] * (128 - len(words))
+    vsa = ValueSetAnalysis(memory)
+    for (entry, registers) in seeds or [(0, [0] * 8)]:
+        vsa.seed(entry * 2, registers)
+    return vsa.run()
+
+def place(words, addr, *values):
+    words.extend([21] * (addr - len(words)))
+    words.extend(values)
+    return words
+
+class ValueSetAnalysisTest(unittest.TestCase):
+    def test_resolves_bounds_checked_jump_table(self):
+        words = [
+            20, R0,           # 0: in R0
+            5, R1, R0, 2,     # 2: gt R1 R0 2
+            7, R1, 0,         # 6: jt R1 0
+            9, R2, R0, 40,    # 9: add R2 R0 40
+            15, R3, R2,       # 13: rmem R3 R2
+            6, R3,            # 16: jmp R3
+        ]
+        place(words, 40, 60, 62, 64)
+        vsa = analyse(words)
+        self.assertEqual(vsa.jumps, {32: [120, 124, 128]})
+        self.assertEqual(vsa.accesses, {26: [80, 82, 84]})
+
+    def test_predicate_overwriting_compared_register(self):
+        words = [
+            1, R0, 5,         # 0: set R0 5
+            1, R1, 20,        # 3: set R1 20
+            4, R0, R0, 5,     # 6: eq R0 R0 5
+            7, R0, R1,        # 10: jt R0 R1
+            0,                # 13: halt
+        ]
+        place(words, 20, 0)
+        vsa = analyse(words)
+        self.assertEqual(vsa.jumps, {20: [40]})
+        self.assertIn(20, vsa.states)
+
+    def test_ignores_infeasible_conditional_edges(self):
+        words = [
+            1, R1, 20,        # 0: set R1 20
+            7, R0, R1,        # 3: jt R0 R1
+            8, R0, R1,        # 6: jf R0 R1
+            0,                # 9: halt
+        ]
+        place(words, 20, 0)
+        vsa = analyse(words)
+        self.assertEqual(vsa.jumps, {12: [40]})
+        self.assertNotIn(9, vsa.states)
+
+    def test_calls_clobber_registers(self):
+        words = [
+            1, R0, 20,        # 0: set R0 20
+            17, 30,           # 3: call 30
+            6, R0,            # 5: jmp R0
+        ]
+        place(words, 30, 18)
+        vsa = analyse(words)
+        self.assertEqual(vsa.functions, set([60]))
+        self.assertEqual(vsa.jumps, {})
+        self.assertEqual(vsa.states[5][0][0], TOP)
+
+    def test_unresolved_store_invalidates_loads(self):
+        words = [
+            1, R1, 40,        # 0: set R1 40
+            15, R0, R1,       # 3: rmem R0 R1
+            6, R0,            # 6: jmp R0
+        ]
+        place(words, 20, 20, R2, 16, R2, 0, 0) # 20: in R2, wmem R2 0, halt
+        place(words, 40, 50)
+        self.assertEqual(analyse(words).jumps, {12: [100]})
+
+        # Store analysed after the load, through an address known only as an
+        # interval, still reaches it
+        vsa = analyse(words, (0, [0] * 8), (20, None))
+        self.assertEqual(vsa.jumps, {})
+        self.assertEqual(vsa.accesses, {6: [80]})
+
+    def test_unknown_registers_at_seeded_functions(self):
+        vsa = analyse([6, R0], (0, None))
+        self.assertEqual(vsa.jumps, {})
+        self.assertEqual(vsa.states[0][0][0], TOP)
+
+if __name__ == '__main__':
+    unittest.main()